@@ -1,53 +1,170 @@
 import cv2
 import numpy as np
-from pyzbar.pyzbar import decode
-import json
+from pyzbar.pyzbar import decode, ZBarSymbol
+import orjson
 import base64
-import boto3
-import io
+import hashlib
+import os
+import threading
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
-def detect_barcode(image_bytes):
-    """Process image bytes to detect barcodes"""
+# Decoder used by detect_barcode: "pyzbar" (default) or "zxing" for zxing-cpp
+BARCODE_BACKEND = os.environ.get('BARCODE_BACKEND', 'pyzbar')
+if BARCODE_BACKEND == 'zxing':
+    import zxingcpp
+
+# zxing-cpp format names for each ZBar symbology
+ZXING_FORMATS = {
+    'EAN13': 'EAN13',
+    'EAN8': 'EAN8',
+    'UPCA': 'UPCA',
+    'UPCE': 'UPCE',
+    'CODE128': 'Code128',
+    'CODE93': 'Code93',
+    'CODE39': 'Code39',
+    'CODABAR': 'Codabar',
+    'I25': 'ITF',
+    'DATABAR': 'DataBar',
+    'DATABAR_EXP': 'DataBarExpanded',
+    'PDF417': 'PDF417',
+    'QRCODE': 'QRCode'
+}
+ZBAR_TYPES = {name: symbol for symbol, name in ZXING_FORMATS.items()}
+
+# Created on first S3 access and reused by later warm invocations
+_S3 = None
+
+# Upper bound on concurrent S3 downloads for multi-record events
+MAX_S3_WORKERS = 8
+
+# Results of recent detections, keyed by a hash of the image bytes
+_CACHE = OrderedDict()
+CACHE_SIZE = 128
+
+# Product barcode symbologies scanned by default; pass symbols to
+# detect_barcode to look for others (e.g. ZBarSymbol.QRCODE). UPC-A is
+# left out on purpose: the EAN-13 decoder already reads it and reports the
+# zero-prefixed 13-digit GTIN, as ZBar's default configuration does
+BARCODE_SYMBOLS = (
+    ZBarSymbol.EAN13,
+    ZBarSymbol.EAN8,
+    ZBarSymbol.UPCE,
+    ZBarSymbol.CODE128
+)
+
+# Longest image side (in pixels) used for the first decoding attempt
+MAX_DECODE_SIDE = 1200
+
+# Reusable OpenCV output buffers, one per purpose and thread, so callers
+# running detect_barcode from several threads never share one
+_BUFS = threading.local()
+
+def _get_buffer(name, shape):
+    """Return this thread's uint8 buffer for name, reallocating if the shape changed"""
+    bufs = _BUFS.__dict__
+    buf = bufs.get(name)
+    if buf is None or buf.shape != shape:
+        buf = bufs[name] = np.empty(shape, np.uint8)
+    return buf
+
+def downscale_image(image, max_side=MAX_DECODE_SIDE, reuse_buffer=False):
+    """Shrink an image so its longest side is at most max_side pixels
+
+    With reuse_buffer the result is written into a per-thread buffer that
+    the next reusing call in the same thread overwrites.
+    """
+    h, w = image.shape[:2]
+    scale = min(1.0, max_side / max(h, w))
+    if scale == 1.0:
+        return image
+    size = (round(w * scale), round(h * scale))
+    dst = _get_buffer("downscale", (size[1], size[0])) if reuse_buffer else None
+    return cv2.resize(image, size, dst=dst, interpolation=cv2.INTER_AREA)
+
+def detect_barcode(image_bytes, symbols=BARCODE_SYMBOLS):
+    """Process image bytes to detect barcodes of the given symbologies"""
+    # Identical images (retries, replays) are answered from the cache
+    symbols = tuple(symbols)
+    cache_key = (hashlib.blake2b(image_bytes, digest_size=16).digest(), symbols)
+    if cache_key in _CACHE:
+        _CACHE.move_to_end(cache_key)
+        return _CACHE[cache_key]
+    
     # Convert bytes to numpy array
     nparr = np.frombuffer(image_bytes, np.uint8)
-    image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+    image = cv2.imdecode(nparr, cv2.IMREAD_GRAYSCALE)
+    
+    # Try a downscaled copy first - ZBar's scan cost is linear in pixel count
+    small = downscale_image(image, reuse_buffer=True)
+    result = scan_image(small, symbols)
+    
+    # Fall back to full resolution if the barcode was lost when shrinking
+    if result is None and small is not image:
+        result = scan_image(image, symbols)
+    
+    _CACHE[cache_key] = result
+    if len(_CACHE) > CACHE_SIZE:
+        _CACHE.popitem(last=False)
+    
+    return result
+
+def decode_barcodes(image, symbols=BARCODE_SYMBOLS):
+    """Decode an image with the configured backend, returning (data, type) pairs"""
+    if BARCODE_BACKEND == 'zxing':
+        names = [ZXING_FORMATS[symbol.name] for symbol in symbols if symbol.name in ZXING_FORMATS]
+        # An empty format list means "every format" to zxing-cpp
+        if not names:
+            return []
+        formats = zxingcpp.barcode_formats_from_str(','.join(names))
+        # Report types with ZBar's names so responses match across backends
+        return [(barcode.text, ZBAR_TYPES.get(barcode.format.name, barcode.format.name))
+                for barcode in zxingcpp.read_barcodes(image, formats=formats)]
+    
+    return [(barcode.data.decode("utf-8"), barcode.type)
+            for barcode in decode(image, symbols=symbols)]
+
+def scan_image(gray, symbols=BARCODE_SYMBOLS):
+    """Run the preprocessing cascade over a grayscale image"""
+    # Preprocessing methods - ordered by reliability. Each one is only
+    # computed if every method before it failed to find a barcode.
+    methods = (
+        ("original", lambda: gray),
+        ("gaussian_blur", lambda: cv2.GaussianBlur(gray, (5, 5), 0, dst=_get_buffer("blur", gray.shape)))
+    )
     
-    # Preprocessing methods - ordered by reliability
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    methods = [
-        ("original", gray),
-        ("adaptive_threshold", cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, 
-                                  cv2.THRESH_BINARY, 11, 2)),
-        ("gaussian_blur", cv2.GaussianBlur(gray, (5, 5), 0))
-    ]
+    # zxing-cpp retries internally, so the blur pass would only repeat
+    # its work
+    if BARCODE_BACKEND == 'zxing':
+        methods = methods[:1]
     
     # Track detected barcodes and their frequency
-    barcode_counts = {}
-    barcode_objects = {}
+    barcode_counts = Counter()
+    methods_tried = 0
     
-    # Process methods in order of reliability
-    for method_name, processed_img in methods:
-        barcodes = decode(processed_img)
-        for barcode in barcodes:
-            data = barcode.data.decode("utf-8")
-            barcode_type = barcode.type
-            key = (data, barcode_type)
-            
-            # Count frequency across methods
-            barcode_counts[key] = barcode_counts.get(key, 0) + 1
-            
-            # Store the barcode object 
-            if key not in barcode_objects:
-                barcode_objects[key] = barcode
+    # Process methods in order of reliability, stopping at the first hit
+    for method_name, preprocess in methods:
+        methods_tried += 1
+        barcodes = decode_barcodes(preprocess(), symbols)
+        seen_this_method = set()
+        for key in barcodes:
+            # Count each barcode once per method, even if it was found in
+            # several regions of the image
+            if key not in seen_this_method:
+                seen_this_method.add(key)
+                barcode_counts[key] += 1
+        
+        if barcode_counts:
+            break
     
     # No barcodes found
     if not barcode_counts:
         return None
     
-    # Get the most frequently detected barcode
-    best_barcode = max(barcode_counts.items(), key=lambda x: x[1])
-    data, barcode_type = best_barcode[0]
-    confidence = best_barcode[1] / len(methods)
+    # Get the most frequently detected barcode; confidence drops the more
+    # preprocessing was needed to find it
+    (data, barcode_type), best_count = barcode_counts.most_common(1)[0]
+    confidence = best_count / methods_tried
     
     return {
         'data': data,
@@ -55,11 +172,73 @@ def detect_barcode(image_bytes):
         'confidence': confidence
     }
 
+def get_s3_client():
+    """Return the shared S3 client, importing boto3 on first use"""
+    global _S3
+    if _S3 is None:
+        import boto3
+        _S3 = boto3.client('s3')
+    return _S3
+
 def get_image_from_s3(bucket, key):
     """Get image bytes from S3"""
-    s3_client = boto3.client('s3')
-    response = s3_client.get_object(Bucket=bucket, Key=key)
-    return response['Body'].read()
+    return get_s3_client().get_object(Bucket=bucket, Key=key)['Body'].read()
+
+def get_images_from_s3(locations):
+    """Yield a future with the image bytes for each (bucket, key) pair, downloading ahead of the caller"""
+    workers = min(MAX_S3_WORKERS, len(locations))
+    get_s3_client()  # create the client before the worker threads race for it
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        yield from [executor.submit(get_image_from_s3, bucket, key) for bucket, key in locations]
+
+def detect_barcodes_in_s3(locations, context):
+    """Detect barcodes in several S3 objects, overlapping downloads with decoding"""
+    results = []
+    for (bucket, key), download in zip(locations, get_images_from_s3(locations)):
+        # A failing object only fails its own entry, not the whole batch
+        try:
+            result = detect_barcode(download.result())
+        except Exception:
+            results.append({
+                "bucket": bucket,
+                "key": key,
+                "error": {
+                    "code": "PROCESSING_ERROR",
+                    "message": "An error occurred while processing the image"
+                }
+            })
+            continue
+        
+        if result:
+            results.append({
+                "bucket": bucket,
+                "key": key,
+                "barcodeValue": result['data'],
+                "barcodeType": result['type'],
+                "confidence": result['confidence']
+            })
+        else:
+            results.append({
+                "bucket": bucket,
+                "key": key,
+                "error": {
+                    "code": "BARCODE_NOT_FOUND",
+                    "message": "No barcode could be detected in the provided image"
+                }
+            })
+    
+    return {
+        "statusCode": 200,
+        "headers": {
+            "Content-Type": "application/json",
+            "Access-Control-Allow-Origin": "*"
+        },
+        "body": orjson.dumps({
+            "success": True,
+            "data": results,
+            "requestId": context.awsRequestId
+        }).decode()
+    }
 
 def lambda_handler(event, context):
     """AWS Lambda handler function"""
@@ -71,9 +250,14 @@ def lambda_handler(event, context):
         
         # Check if the event is from S3
         elif 'Records' in event and event['Records'][0].get('eventSource') == 'aws:s3':
-            record = event['Records'][0]['s3']
-            bucket = record['bucket']['name']
-            key = record['object']['key']
+            locations = [(record['s3']['bucket']['name'], record['s3']['object']['key'])
+                         for record in event['Records'] if record.get('eventSource') == 'aws:s3']
+            
+            # Several objects in one event are fetched concurrently
+            if len(locations) > 1:
+                return detect_barcodes_in_s3(locations, context)
+            
+            bucket, key = locations[0]
             image_bytes = get_image_from_s3(bucket, key)
         
         # Direct binary content (for testing)
@@ -83,7 +267,7 @@ def lambda_handler(event, context):
         else:
             return {
                 'statusCode': 400,
-                'body': json.dumps({'error': 'Invalid input format'})
+                'body': orjson.dumps({'error': 'Invalid input format'}).decode()
             }
         
         # Detect barcode
@@ -96,7 +280,7 @@ def lambda_handler(event, context):
                     "Content-Type": "application/json",
                     "Access-Control-Allow-Origin": "*"
                 },
-                "body": json.dumps({
+                "body": orjson.dumps({
                     "success": True,
                     "data": {
                         "barcodeValue": result['data'],
@@ -104,7 +288,7 @@ def lambda_handler(event, context):
                         "confidence": result['confidence']
                     },
                     "requestId": context.awsRequestId
-                })
+                }).decode()
             }
         
         # No barcode found
@@ -115,14 +299,14 @@ def lambda_handler(event, context):
                     "Content-Type": "application/json",
                     "Access-Control-Allow-Origin": "*"
                 },
-                "body": json.dumps({
+                "body": orjson.dumps({
                     "success": False,
                     "error": {
                         "code": "BARCODE_NOT_FOUND",
                         "message": "No barcode could be detected in the provided image"
                     },
                     "requestId": context.awsRequestId
-                })
+                }).decode()
             }
             
     except Exception as e:
@@ -133,12 +317,12 @@ def lambda_handler(event, context):
                 "Content-Type": "application/json",
                 "Access-Control-Allow-Origin": "*"
             },
-            "body": json.dumps({
-                "success": false,
+            "body": orjson.dumps({
+                "success": False,
                 "error": {
                     "code": "PROCESSING_ERROR",
                     "message": "An error occurred while processing the image"
                 },
                 "requestId": context.awsRequestId
-            })
+            }).decode()
         }
\ No newline at end of file
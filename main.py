@@ -1,17 +1,30 @@
 import cv2
 import numpy as np
 from pyzbar.pyzbar import decode
-import matplotlib.pyplot as plt
 import os
+import sys
 import glob
 
+# 3x3 sharpening kernel, built once instead of on every call
+_SHARPEN_KERNEL = np.array([[-1,-1,-1], [-1,9,-1], [-1,-1,-1]], dtype=np.int8)
+
+# Grayscale standard deviation below which an image counts as low contrast
+LOW_CONTRAST_STD = 15
+
+def has_display():
+    """Check whether result windows can be shown on this host"""
+    # Without a display server OpenCV's Qt build aborts the process on imshow
+    if sys.platform.startswith("linux"):
+        return bool(os.environ.get("DISPLAY") or os.environ.get("WAYLAND_DISPLAY"))
+    return True
+
 def enhance_image_for_barcode(image):
     """Apply image preprocessing to enhance barcode detection"""
     # Convert to grayscale if it's not already
     if len(image.shape) == 3:
         gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
     else:
-        gray = image.copy()
+        gray = image
     
     # Apply adaptive thresholding to handle different lighting conditions
     thresh = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, 
@@ -22,27 +35,31 @@ def enhance_image_for_barcode(image):
         ("original", gray),
         ("adaptive_threshold", thresh),
         ("gaussian_blur", cv2.GaussianBlur(gray, (5, 5), 0)),
-        ("sharpen", cv2.filter2D(gray, -1, np.array([[-1,-1,-1], [-1,9,-1], [-1,-1,-1]])))
+        ("sharpen", cv2.filter2D(gray, -1, _SHARPEN_KERNEL))
     ]
     
     return preprocessing_methods
 
 def detect_and_decode_barcode(image_path, save_result=True, show_result=True):
     """Detect and decode barcodes from an image file"""
-    # Read the image
-    image = cv2.imread(image_path)
-    if image is None:
+    # Read the image once - in color only if there are results to draw on,
+    # otherwise straight to grayscale
+    if save_result:
+        result_image = cv2.imread(image_path)
+        gray = cv2.cvtColor(result_image, cv2.COLOR_BGR2GRAY) if result_image is not None else None
+    else:
+        result_image = None
+        gray = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+    
+    if gray is None:
         print(f"Error: Could not read image {image_path}")
         return None
     
-    # Make a copy for drawing results
-    result_image = image.copy()
-    
     # Get filename without extension for saving results
     base_name = os.path.splitext(os.path.basename(image_path))[0]
     
     # Apply different preprocessing methods for better detection
-    preprocessing_methods = enhance_image_for_barcode(image)
+    preprocessing_methods = enhance_image_for_barcode(gray)
     
     # Initialize variables to track if we found any barcodes
     found_barcode = False
@@ -71,6 +88,9 @@ def detect_and_decode_barcode(image_path, save_result=True, show_result=True):
                 print(f"Barcode Data: {barcode_data}")
                 print(f"Barcode Type: {barcode_type}")
                 
+                if result_image is None:
+                    continue
+                
                 # Draw a rectangle around the barcode
                 (x, y, w, h) = barcode.rect
                 cv2.rectangle(result_image, (x, y), (x + w, y + h), (0, 255, 0), 2)
@@ -83,11 +103,14 @@ def detect_and_decode_barcode(image_path, save_result=True, show_result=True):
     
     if not found_barcode:
         print(f"No barcodes found in {image_path}")
-        # Try more aggressive processing as a last resort
+    
+    # Try more aggressive processing as a last resort, but only on
+    # low-dynamic-range images. Doubling the intensities helps dim images;
+    # bright ones mostly clip to white
+    if not found_barcode and gray.std() < LOW_CONTRAST_STD:
         # Increase contrast
-        contrast_img = cv2.convertScaleAbs(image, alpha=2.0, beta=0)
-        gray_contrast = cv2.cvtColor(contrast_img, cv2.COLOR_BGR2GRAY)
-        barcodes = decode(gray_contrast)
+        contrast_img = cv2.convertScaleAbs(gray, alpha=2.0, beta=0)
+        barcodes = decode(contrast_img)
         
         if barcodes:
             print(f"Found {len(barcodes)} barcode(s) using high contrast method")
@@ -101,21 +124,19 @@ def detect_and_decode_barcode(image_path, save_result=True, show_result=True):
     
     # Save or show results
     if save_result and found_barcode:
-        # Convert image from BGR to RGB (Matplotlib uses RGB)
-        result_image_rgb = cv2.cvtColor(result_image, cv2.COLOR_BGR2RGB)
-        
-        plt.figure(figsize=(10, 8))
-        plt.imshow(result_image_rgb)
-        plt.axis('off')
-        plt.title(f"Detected Barcodes: {len(all_barcodes)}")
-        
         # Save the result
         output_filename = f"{base_name}_detected.png"
-        plt.savefig(output_filename)
+        cv2.imwrite(output_filename, result_image)
         print(f"Result saved as {output_filename}")
         
-        if show_result:
-            plt.show()
+        if show_result and has_display():
+            try:
+                cv2.imshow(f"Detected Barcodes: {len(all_barcodes)}", result_image)
+                cv2.waitKey(0)
+                cv2.destroyAllWindows()
+            except cv2.error:
+                # Headless OpenCV builds have no GUI support
+                print("Cannot display result on this host")
     
     return all_barcodes
 
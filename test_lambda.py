@@ -1,11 +1,28 @@
 # Create a test_locally.py file
+import base64
+import io
+import json
 import cv2
 import numpy as np
 from pyzbar.pyzbar import decode
-from lambda_function import detect_barcode  # Import your Lambda function
+import lambda_function
+from lambda_function import detect_barcode, lambda_handler  # Import your Lambda function
+
+class FakeContext:
+    awsRequestId = "test-request"
+
+class FakeS3:
+    def __init__(self, objects):
+        self.objects = objects
+    
+    def get_object(self, Bucket, Key):
+        return {'Body': io.BytesIO(self.objects[(Bucket, Key)])}
+
+def s3_record(bucket, key):
+    return {'eventSource': 'aws:s3', 's3': {'bucket': {'name': bucket}, 'object': {'key': key}}}
 
 # Test with a local image
-def test_with_file(img):
+def run_with_file(img):
     with open(img, 'rb') as f:
         image_bytes = f.read()
     
@@ -13,8 +30,56 @@ def test_with_file(img):
     result = detect_barcode(image_bytes)
     print("Result:", result)
 
+def test_lambda_handler_found():
+    with open('barcode.png', 'rb') as f:
+        event = {'image': base64.b64encode(f.read()).decode()}
+    
+    response = lambda_handler(event, FakeContext())
+    assert response['statusCode'] == 200
+    body = json.loads(response['body'])
+    assert body['success'] is True
+    assert body['data']['barcodeValue'] == 'Wikipedia'
+    assert body['data']['barcodeType'] == 'CODE128'
+
+def test_lambda_handler_error():
+    event = {'image': base64.b64encode(b'not an image').decode()}
+    
+    response = lambda_handler(event, FakeContext())
+    assert response['statusCode'] == 500
+    body = json.loads(response['body'])
+    assert body['success'] is False
+    assert body['error']['code'] == 'PROCESSING_ERROR'
+
+def test_lambda_handler_s3_batch():
+    with open('barcode.png', 'rb') as f:
+        objects = {('images', 'barcode.png'): f.read(), ('images', 'broken.png'): b'not an image'}
+    event = {'Records': [s3_record('images', 'barcode.png'),
+                         s3_record('images', 'missing.png'),
+                         s3_record('images', 'broken.png')]}
+    
+    s3_client = lambda_function._S3
+    lambda_function._S3 = FakeS3(objects)
+    try:
+        response = lambda_handler(event, FakeContext())
+    finally:
+        lambda_function._S3 = s3_client
+    
+    assert response['statusCode'] == 200
+    body = json.loads(response['body'])
+    assert body['success'] is True
+    found, missing, broken = body['data']
+    assert found['key'] == 'barcode.png'
+    assert found['barcodeValue'] == 'Wikipedia'
+    assert missing['key'] == 'missing.png'
+    assert missing['error']['code'] == 'PROCESSING_ERROR'
+    assert broken['key'] == 'broken.png'
+    assert broken['error']['code'] == 'PROCESSING_ERROR'
+
 if __name__ == "__main__":
-    test_with_file('IMG_6760.jpeg')
-    test_with_file('IMG_6761.jpeg')
-    test_with_file('IMG_6764.jpeg')
-    test_with_file('IMG_6759.jpeg')
\ No newline at end of file
+    run_with_file('IMG_6760.jpeg')
+    run_with_file('IMG_6761.jpeg')
+    run_with_file('IMG_6764.jpeg')
+    run_with_file('IMG_6759.jpeg')
+    test_lambda_handler_found()
+    test_lambda_handler_error()
+    test_lambda_handler_s3_batch()
\ No newline at end of file